@@ -0,0 +1,262 @@
+from datetime import datetime
+from serial import Serial
+from time import sleep
+from threading import Thread, Event, Lock
+from queue import Queue
+from os import makedirs, path
+from re import search
+from events import EventDetector, event_writer
+
+ser = Serial(baudrate=115200, timeout=1)
+history = None  # Set by the dashboard, the headless logger has no view to keep it for
+tick_time = None
+log_path = ""
+detector = EventDetector(channels=12)
+event_queue = Queue()
+pipeline_lock = Lock()
+
+def write_data(base_path, timestamp, values):
+
+    # Files are named from the sample's own time, so replayed data lands on its original day
+    year = timestamp.strftime("%Y")
+    month = timestamp.strftime("%B")
+    week = f"Week-{timestamp.strftime('%U')}"
+    day = f"Day-{timestamp.strftime('%d')}.txt"
+
+    # Make month path
+    month_folder_path = path.join(base_path, year, month)
+
+    # Check if month folder exists
+    if not path.exists(month_folder_path):
+        makedirs(month_folder_path)
+
+    # Make week path
+    week_folder_path = path.join(month_folder_path, week)
+
+    # Check if week folder exists
+    if not path.exists(week_folder_path):
+        makedirs(week_folder_path)
+
+    # Make the full path
+    day_file_path = path.join(week_folder_path, day)
+    file_exists = path.exists(day_file_path)
+
+    # Open the file for appending
+    with open(day_file_path, "a") as file:
+        if not file_exists:
+            # Write a header if the file is new
+            file.write(
+                "# Magnetic field log file for {}/{}/{}, created at {}:{}:{}. Field values are in uT.\n".format(
+                    timestamp.strftime("%Y"),
+                    timestamp.strftime("%m"),
+                    timestamp.strftime("%d"),
+                    timestamp.strftime("%H"),
+                    timestamp.strftime("%M"),
+                    timestamp.strftime("%S"),
+                )
+            )
+        file.write(
+            "{}:{}:{}:{}\t".format(
+                timestamp.strftime("%H"),
+                timestamp.strftime("%M"),
+                timestamp.strftime("%S"),
+                timestamp.strftime("%f"),
+            )
+        )
+        for i in range(12):
+            if i != 11:
+                file.write("{:.6f}\t".format(values[i]))
+            else:
+                file.write("{:.6f}\n".format(values[i]))
+
+    return day_file_path
+
+
+def server_tick(event_a):
+    """This function is used to generate the 1s interval to sample the instruments. Doing it
+        it in the background of the server prevents possible collisions if there is more than one
+        client viewing the dashboard. It also allows the instruments to still be read and logged
+        even when no clients are connected.
+
+    Args:
+        event (Event): Triggers arduino to read sensors
+    """
+
+    global tick_time
+
+    while True:
+
+        sleep(0.5)  # Sets the sample rate to 1 second
+        tick_time = datetime.now()
+        event_a.set()
+        print("tick", datetime.now().strftime("%H:%M:%S:%f"))
+
+
+def record(timestamp, values):
+    """Stores one set of sensor readings and passes it down the pipeline: event detection,
+        then logging if it is enabled. Live acquisition and log replay both go through here.
+
+    Args:
+        timestamp (datetime): Time of the sample
+        values (list): One reading per sensor in uT, nan for missing sensors
+    """
+
+    with pipeline_lock:
+        if history is not None:
+            history.append(timestamp, values)
+
+        event = detector.update(timestamp, values)
+
+        if event_log.is_set():
+            write_data(log_path, timestamp, values)
+            if event is not None:
+                event_queue.put((log_path, event))
+
+
+def read_sensors(event_read, event_connected, event_log):
+    while True:
+        event_read.wait()
+
+        if event_connected.is_set():
+            ser.write(b"R")
+            values = ser.readline().decode().strip().split()
+            # values = np.random.uniform(0, 1, 12)
+            record(
+                tick_time,
+                [
+                    float("nan") if values[i] == "999.00000000" else float(values[i])
+                    for i in range(12)
+                ],
+            )
+
+        event_read.clear()
+
+
+def connect(port):
+    """Opens the serial port and checks that a magnetometer controller is on the other end.
+
+    Args:
+        port (str): Serial port of the controller
+
+    Returns:
+        bool: True if the controller answered
+    """
+
+    try:
+        ser.port = port
+        ser.open()
+    except:
+        print("failed to open serial port")
+        return False
+
+    sleep(3)  # The arduino resets when the port is opened
+    ser.write(b"I")
+    if ser.readline().decode().strip() == "Magnetometer Controller":
+        event_connected.set()
+        return True
+
+    ser.close()
+    return False
+
+
+def replay(file_path, speed=0):
+    """Feeds a log or event file back through the same pipeline as live data. The file's
+        timestamps are kept, only the waits between samples are shortened.
+
+    Args:
+        file_path (str): Log file to replay
+        speed (float): Playback speed relative to real time, 0 to run as fast as possible
+
+    Returns:
+        int: Number of samples replayed
+    """
+
+    date = None
+    previous = None
+    count = 0
+
+    with open(file_path) as file:
+        for line in file:
+            if line.startswith("#"):
+                match = search(r"(\d{4})/(\d{2})/(\d{2})", line)
+                if date is None and match:
+                    date = datetime(*(int(part) for part in match.groups()))
+                continue
+
+            fields = line.split()
+            if len(fields) != 13:
+                continue
+
+            hour, minute, second, microsecond = (int(part) for part in fields[0].split(":"))
+            timestamp = (date or datetime.now()).replace(
+                hour=hour, minute=minute, second=second, microsecond=microsecond
+            )
+
+            if speed > 0 and previous is not None:
+                wait = (timestamp - previous).total_seconds() / speed
+                if wait > 0:
+                    sleep(wait)
+            previous = timestamp
+
+            record(timestamp, [float(value) for value in fields[1:]])
+            count += 1
+
+    return count
+
+
+event_read = Event()
+event_connected = Event()
+event_log = Event()
+
+
+def start(acquire=True):
+    """Starts the background threads. Importing this module does not start anything, so the
+        headless logger and the dashboard can each decide when to.
+
+    Args:
+        acquire (bool): Also start the sample clock and sensor reads. Off when replaying logs.
+    """
+
+    if acquire:
+        thread0 = Thread(
+            target=server_tick,
+            args=(event_read,),
+            daemon=True,
+        )
+        thread0.start()
+
+        thread1 = Thread(
+            target=read_sensors,
+            args=(
+                event_read,
+                event_connected,
+                event_log,
+            ),
+            daemon=True,
+        )
+        thread1.start()
+
+    thread2 = Thread(
+        target=event_writer,
+        args=(event_queue,),
+        daemon=True,
+    )
+    thread2.start()
+
+
+def stop():
+    """Stops reading the sensors and writes out any event still being collected or waiting
+        to be written, so nothing is lost on shutdown.
+    """
+
+    event_connected.clear()
+
+    with pipeline_lock:
+        event = detector.flush()
+        if event is not None and event_log.is_set():
+            event_queue.put((log_path, event))
+
+    event_queue.join()
+
+    if ser.is_open:
+        ser.close()
@@ -3,137 +3,25 @@ from dash import dcc, html, ctx
 from dash.dependencies import Input, Output, State
 import plotly.graph_objs as go
 from numpy import linspace, nanmin, nanmax
-from datetime import datetime
-from serial import Serial
-from collections import deque
-from time import sleep
-from pandas import Series
-from threading import Thread, Event
-from os import makedirs, path
-
-ser = Serial(baudrate=115200, timeout=1)
-readings = [deque(maxlen=36000) for _ in range(12)]
-timestamps = deque(maxlen=36000)
-connected = False
-log_path = ""
-
-def write_data(base_path):
-
-    now = datetime.now()
-    year = now.strftime("%Y")
-    month = now.strftime("%B")
-    week = f"Week-{now.strftime('%U')}"
-    day = f"Day-{now.strftime('%d')}.txt"
-
-    # Make month path
-    month_folder_path = path.join(base_path, year, month)
-
-    # Check if month folder exists
-    if not path.exists(month_folder_path):
-        makedirs(month_folder_path)
-
-    # Make week path
-    week_folder_path = path.join(month_folder_path, week)
-
-    # Check if week folder exists
-    if not path.exists(week_folder_path):
-        makedirs(week_folder_path)
-
-    # Make the full path
-    day_file_path = path.join(week_folder_path, day)
-    file_exists = path.exists(day_file_path)
-
-    # Open the file for appending
-    with open(day_file_path, "a") as file:
-        if not file_exists:
-            # Write a header if the file is new
-            file.write(
-                "# Magnetic field log file for {}/{}/{}, created at {}:{}:{}. Field values are in uT.\n".format(
-                    now.strftime("%Y"),
-                    now.strftime("%m"),
-                    now.strftime("%d"),
-                    now.strftime("%H"),
-                    now.strftime("%M"),
-                    now.strftime("%S"),
-                )
-            )
-        file.write(
-            "{}:{}:{}:{}\t".format(
-                timestamps[-1].strftime("%H"),
-                timestamps[-1].strftime("%M"),
-                timestamps[-1].strftime("%S"),
-                timestamps[-1].strftime("%f"),
-            )
-        )
-        for i in range(12):
-            if i != 11:
-                file.write("{:.6f}\t".format(readings[i][-1]))
-            else:
-                file.write("{:.6f}\n".format(readings[i][-1]))
-
-    return day_file_path
-
-
-def server_tick(event_a):
-    """This function is used to generate the 1s interval to sample the instruments. Doing it
-        it in the background of the server prevents possible collisions if there is more than one
-        client viewing the dashboard. It also allows the instruments to still be read and logged
-        even when no clients are connected.
-
-    Args:
-        event (Event): Triggers arduino to read sensors
-    """
-
-    while True:
-
-        sleep(0.5)  # Sets the sample rate to 1 second
-        timestamps.append(datetime.now())
-        event_a.set()
-        print("tick", datetime.now().strftime("%H:%M:%S:%f"))
-
-
-def read_sensors(event_read, event_connected, event_log):
-    global log_path
-    while True:
-        event_read.wait()
-
-        if event_connected.is_set():
-            ser.write(b"R")
-            values = ser.readline().decode().strip().split()
-            # values = np.random.uniform(0, 1, 12)
-            for i in range(12):
-                if values[i] == "999.00000000":
-                    readings[i].append(float("nan"))
-                else:
-                    readings[i].append(float(values[i]))
-
-            if event_log.is_set():
-                write_data(log_path)
-
-        event_read.clear()
-
-
-event_read = Event()
-event_connected = Event()
-event_log = Event()
-
-thread0 = Thread(
-    target=server_tick,
-    args=(event_read,),
-    daemon=True,
-)
-thread0.start()
-
-thread1 = Thread(
-    target=read_sensors,
-    args=(
-        event_read,
-        event_connected,
-        event_log,
+from os import environ, path
+from atexit import register
+import acquisition
+from acquisition import ser, event_connected, event_log
+from history import History
+
+# Live view history. Set MAGNETOMETER_RAM_MB to change how much of it stays in RAM and
+# MAGNETOMETER_SPOOL_DIR to change where older samples are paged out to.
+history = History(
+    channels=12,
+    ram_budget=int(float(environ.get("MAGNETOMETER_RAM_MB", 64)) * 2**20),
+    spool_dir=environ.get(
+        "MAGNETOMETER_SPOOL_DIR", path.join(path.dirname(path.abspath(__file__)), "spool")
     ),
-    daemon=True,
 )
-thread1.start()
+acquisition.history = history
+
+acquisition.start()
+register(acquisition.stop)
 
 # Initialize the app
 app = dash.Dash(
@@ -302,6 +190,40 @@ app.layout = html.Div(
                         "align-items": "center",
                     },
                 ),
+                html.Div(
+                    [
+                        html.Label(
+                            "View:",
+                            style={
+                                "margin-right": "1px",
+                                "margin-left": "15px",
+                                "display": "inline",
+                                "font-size": "25px",
+                            },
+                        ),
+                        dcc.RadioItems(
+                            id="view-window",
+                            options=[
+                                {"label": "10m", "value": 600},
+                                {"label": "1h", "value": 3600},
+                                {"label": "5h", "value": 18000},
+                                {"label": "1d", "value": 86400},
+                                {"label": "3d", "value": 259200},
+                                {"label": "All", "value": 0},
+                            ],
+                            value=18000,
+                            inline=True,
+                            style={"display": "inline"},
+                            labelStyle={"padding-right": "10px", "font-size": "25px"},
+                            className="radio",
+                        ),
+                    ],
+                    style={
+                        "border-right": "1px solid #333333",
+                        "display": "flex",
+                        "align-items": "center",
+                    },
+                ),
                 html.Label(
                     "Plot Style:",
                     style={
@@ -450,6 +372,7 @@ app.layout = html.Div(
     Input("graph-width-slider", "value"),
     Input("graph-height-slider", "value"),
     Input("interval-component", "n_intervals"),
+    Input("view-window", "value"),
     State("grid-rows", "value"),
     State("grid-cols", "value"),
     State("style-toggle", "value"),
@@ -461,6 +384,7 @@ def update_graphs(
     graph_width_value,
     graph_height_value,
     n_intervals,
+    view_window,
     rows,
     cols,
     plot_style,
@@ -494,6 +418,11 @@ def update_graphs(
 
     if selected_sensors is not None and event_connected.is_set():
 
+        # Older samples are paged in from disk only as far back as the view reaches
+        times, values = history.window(view_window, max_points=5000)
+        if not len(times):
+            return [], {}, style
+
         sorted_series = sorted(selected_sensors, key=lambda x: int(x))
 
         # Dynamically calculate the size for each graph if "fit" mode is selected
@@ -532,14 +461,14 @@ def update_graphs(
 
         # Generate a graph for each selected series
         graphs = []
-        times = Series(timestamps, dtype=object)
         for sensor in sorted_series:
+            sensor_values = values[:, int(sensor) - 1]
             num_ticks = 10
             ticks = linspace(
                 # min(readings[int(sensor) - 1], default=0),
                 # max(readings[int(sensor) - 1], default=0),
-                nanmin(readings[int(sensor) - 1]),
-                nanmax(readings[int(sensor) - 1]),
+                nanmin(sensor_values),
+                nanmax(sensor_values),
                 num_ticks,
             )
             tick_labels = [f"{tick:.6g}" for tick in ticks]
@@ -551,8 +480,8 @@ def update_graphs(
                             figure={
                                 "data": [
                                     go.Scatter(
-                                        x=list(times),
-                                        y=list(readings[int(sensor) - 1]),
+                                        x=times,
+                                        y=sensor_values,
                                         mode="lines",
                                         name=sensor,
                                         line={"color": trace_color},
@@ -560,7 +489,7 @@ def update_graphs(
                                 ],
                                 "layout": go.Layout(
                                     title={
-                                        "text": f"Sensor {sensor} = {readings[int(sensor) - 1][-1]:.5f} uT",
+                                        "text": f"Sensor {sensor} = {sensor_values[-1]:.5f} uT",
                                         "font": {
                                             "color": font_color,
                                             "family": "Share Tech Mono",
@@ -678,11 +607,9 @@ def connect_arduino(n_clicks, n_intervals, port, current_class):
     prevent_initial_call=True,
 )
 def start_log(n, user_path):
-    global log_path, event_log
-
     if path.exists(user_path):
 
-        log_path = user_path
+        acquisition.log_path = user_path
 
         if event_log.is_set():
 
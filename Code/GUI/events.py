@@ -0,0 +1,260 @@
+from numpy import abs as nabs, asarray, full, isnan, maximum, nan, where, zeros
+from collections import deque
+from os import makedirs, path
+
+
+class EventDetector:
+    """Flags field transients (passing vehicles, elevators, ...) as the samples arrive and
+        collects a window of raw data around each one. Every check is done on all channels at
+        once against rolling baselines, so the work per sample is constant and does not load
+        the acquisition thread.
+
+        A channel triggers when any of these is true:
+            threshold: |B - baseline| > threshold
+            rate:      |dB/dt| > rate_threshold
+            step:      |fast average - baseline| > step_threshold
+
+    Args:
+        channels (int): Number of sensor channels
+        threshold (float): Deviation from the baseline that triggers an event (uT)
+        rate_threshold (float): Rate of change that triggers an event (uT/s)
+        step_threshold (float): Offset of the short average from the baseline that triggers an event (uT)
+        baseline_samples (int): Time constant of the slow rolling baseline, in samples
+        step_samples (int): Time constant of the short rolling average, in samples
+        pre_samples (int): Samples kept from before the trigger
+        post_samples (int): Samples kept after the last trigger
+        max_samples (int): Longest window written for a single event
+    """
+
+    def __init__(
+        self,
+        channels=12,
+        threshold=5.0,
+        rate_threshold=2.0,
+        step_threshold=1.0,
+        baseline_samples=600,
+        step_samples=5,
+        pre_samples=120,
+        post_samples=120,
+        max_samples=7200,
+    ):
+        self.threshold = threshold
+        self.rate_threshold = rate_threshold
+        self.step_threshold = step_threshold
+        self.baseline_alpha = 1.0 / baseline_samples
+        self.step_alpha = 1.0 / step_samples
+        self.warmup = step_samples * 2
+        self.post_samples = post_samples
+        self.max_samples = max_samples
+
+        self.baseline = full(channels, nan)
+        self.fast = full(channels, nan)
+        self.last = full(channels, nan)
+        self.last_valid = zeros(channels, dtype=bool)
+        self.count = zeros(channels, dtype=int)
+        self.last_time = None
+
+        # Pre-trigger ring, always filled so an event can start with its history
+        self.ring = deque(maxlen=pre_samples)
+        self.event = None
+        self.remaining = 0
+        self.continued = False
+
+    def update(self, timestamp, values):
+        """Feed one sample to the detector.
+
+        Args:
+            timestamp (datetime): Time of the sample
+            values (list): One reading per channel, nan for missing sensors
+
+        Returns:
+            dict: The finished event once its post-trigger window is complete, otherwise None
+        """
+
+        values = asarray(values, dtype=float)
+        valid = ~isnan(values)
+
+        # Seed the averages the first time a channel reports
+        new = valid & (self.count == 0)
+        self.baseline = where(new, values, self.baseline)
+        self.fast = where(new, values, self.fast)
+
+        deviation = values - self.baseline
+        if self.last_time is not None:
+            dt = (timestamp - self.last_time).total_seconds()
+        else:
+            dt = 0
+        if dt > 0:
+            # Only channels that also reported last sample, a gap would inflate the rate
+            rate = where(self.last_valid, nabs(values - self.last) / dt, 0.0)
+        else:
+            rate = zeros(len(values))
+
+        self.fast = where(valid, self.fast + self.step_alpha * (values - self.fast), self.fast)
+        step = self.fast - self.baseline
+
+        ready = valid & (self.count >= self.warmup)
+        over_threshold = ready & (nabs(deviation) > self.threshold)
+        over_rate = ready & (rate > self.rate_threshold)
+        over_step = ready & (nabs(step) > self.step_threshold)
+        triggered = over_threshold | over_rate | over_step
+
+        # Kept for the event metadata, before the triggering sample moves it
+        baseline = self.baseline
+        self.baseline = where(
+            valid, self.baseline + self.baseline_alpha * deviation, self.baseline
+        )
+        self.last = where(valid, values, self.last)
+        self.last_valid = valid
+        self.count += valid
+        self.last_time = timestamp
+
+        sample = (timestamp, values)
+        finished = None
+
+        if self.event is None:
+            if triggered.any():
+                self.event = {
+                    "trigger": timestamp,
+                    "channels": triggered.copy(),
+                    "threshold": over_threshold.copy(),
+                    "rate": over_rate.copy(),
+                    "step": over_step.copy(),
+                    "baseline": baseline.copy(),
+                    "peak": where(valid, nabs(deviation), 0.0),
+                    "continued": self.continued,
+                    "samples": list(self.ring),
+                }
+                self.event["samples"].append(sample)
+                self.remaining = self.post_samples
+            self.continued = False
+        else:
+            event = self.event
+            event["samples"].append(sample)
+            event["peak"] = maximum(event["peak"], where(valid, nabs(deviation), 0.0))
+            if triggered.any():
+                event["channels"] |= triggered
+                event["threshold"] |= over_threshold
+                event["rate"] |= over_rate
+                event["step"] |= over_step
+                self.remaining = self.post_samples
+            else:
+                self.remaining -= 1
+
+            if self.remaining <= 0 or len(event["samples"]) >= self.max_samples:
+                finished = event
+                self.event = None
+                # Cut short while still triggered, so the next event carries straight on
+                self.continued = self.remaining > 0
+
+        if finished is None:
+            self.ring.append(sample)
+        else:
+            # Everything in the ring is already in this event's file
+            self.ring.clear()
+
+        return finished
+
+    def flush(self):
+        """Close the event being collected, if any, e.g. when shutting down.
+
+        Returns:
+            dict: The event cut off at the latest sample, otherwise None
+        """
+
+        finished = self.event
+        self.event = None
+        self.ring.clear()
+        self.continued = False
+
+        return finished
+
+
+def write_event(base_path, event):
+    """Writes an event window to its own file, next to the daily logs.
+
+    Args:
+        base_path (str): Log directory
+        event (dict): Finished event from EventDetector.update
+
+    Returns:
+        str: Path of the event file
+    """
+
+    trigger = event["trigger"]
+    samples = event["samples"]
+
+    folder_path = path.join(
+        base_path, "Events", trigger.strftime("%Y"), trigger.strftime("%B")
+    )
+    if not path.exists(folder_path):
+        makedirs(folder_path)
+
+    event_file_path = path.join(
+        folder_path, f"Event-{trigger.strftime('%d-%H%M%S-%f')}.txt"
+    )
+
+    def channel_list(mask):
+        return ",".join(str(i + 1) for i in range(len(mask)) if mask[i]) or "none"
+
+    with open(event_file_path, "w") as file:
+        file.write(
+            "# Magnetic field event file for {}, triggered at {}. Field values are in uT.\n".format(
+                trigger.strftime("%Y/%m/%d"), trigger.strftime("%H:%M:%S.%f")
+            )
+        )
+        file.write(
+            "# Window: {} to {}, {} samples\n".format(
+                samples[0][0].strftime("%H:%M:%S.%f"),
+                samples[-1][0].strftime("%H:%M:%S.%f"),
+                len(samples),
+            )
+        )
+        file.write("# Triggered sensors: {}\n".format(channel_list(event["channels"])))
+        file.write("# Threshold: {}\n".format(channel_list(event["threshold"])))
+        file.write("# Rate of change: {}\n".format(channel_list(event["rate"])))
+        file.write("# Step: {}\n".format(channel_list(event["step"])))
+        file.write(
+            "# Continues previous event: {}\n".format("yes" if event["continued"] else "no")
+        )
+        file.write(
+            "# Baseline: {}\n".format(
+                "\t".join("{:.6f}".format(value) for value in event["baseline"])
+            )
+        )
+        file.write(
+            "# Peak deviation: {}\n".format(
+                "\t".join("{:.6f}".format(value) for value in event["peak"])
+            )
+        )
+        for timestamp, values in samples:
+            file.write(
+                "{}:{}:{}:{}\t".format(
+                    timestamp.strftime("%H"),
+                    timestamp.strftime("%M"),
+                    timestamp.strftime("%S"),
+                    timestamp.strftime("%f"),
+                )
+            )
+            file.write("\t".join("{:.6f}".format(value) for value in values) + "\n")
+
+    return event_file_path
+
+
+def event_writer(queue):
+    """Writes finished events in the background so file access never holds up the sensor
+        reads.
+
+    Args:
+        queue (Queue): (log directory, event) pairs to write
+    """
+
+    while True:
+        base_path, event = queue.get()
+        try:
+            event_file_path = write_event(base_path, event)
+        except OSError:
+            print("failed to write event")
+        else:
+            print("event saved", event_file_path)
+        queue.task_done()
@@ -0,0 +1,249 @@
+from numpy import ceil, concatenate, empty, fmax, fmin, inf, isnan, load, save, where
+from bisect import bisect_right
+from datetime import datetime
+from glob import glob
+from os import makedirs, path, remove
+from shutil import rmtree
+from tempfile import mkdtemp
+from threading import Lock
+from atexit import register
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class History:
+    """Sample history for the live view, kept in fixed size segments. The newest segments stay
+        in RAM; once they go over the RAM budget the oldest are written out to the spool
+        directory and memory mapped back only when a view window reaches them. This lets the
+        view cover days of data with a small, fixed amount of memory.
+
+        Each segment row is [time, sensor 1, ..., sensor N], with time in seconds since 1970
+        on the local clock.
+
+    Args:
+        channels (int): Number of sensor channels
+        segment_samples (int): Samples per segment
+        ram_budget (int): Bytes of samples to keep in RAM, including the segment being filled
+        max_samples (int): Oldest samples past this count are dropped
+        spool_dir (str): Where paged out segments are written, the system temp directory if None.
+            Use persistent storage where /tmp is tmpfs, or paged out segments stay in RAM.
+            Spools left there by a previous run that did not exit cleanly are removed, so
+            give each running process its own spool_dir.
+    """
+
+    def __init__(
+        self,
+        channels=12,
+        segment_samples=3600,
+        ram_budget=64 * 2**20,
+        max_samples=7 * 24 * 3600 * 2,
+        spool_dir=None,
+    ):
+        self.channels = channels
+        self.segment_samples = segment_samples
+        self.ram_budget = ram_budget
+        self.max_segments = max(1, -(-max_samples // segment_samples))
+
+        if spool_dir is not None:
+            if not path.exists(spool_dir):
+                makedirs(spool_dir)
+            for stale in glob(path.join(spool_dir, "magnetometer-*")):
+                rmtree(stale, ignore_errors=True)
+        self.spool_dir = mkdtemp(prefix="magnetometer-", dir=spool_dir)
+
+        # Sealed segments, oldest first, as (number, data). The first `paged` hold the path
+        # of their file, the rest the array itself. Sealed segments never change.
+        self.segments = []
+        self.starts = []
+        self.paged = 0
+        self.sealed = 0
+
+        # Paged out files being read outside the lock, and those to delete once they are not
+        self.readers = {}
+        self.dropped = set()
+
+        # Envelope of each whole sealed segment, for the step it was last drawn at
+        self.envelopes = {}
+
+        self.current = empty((segment_samples, channels + 1))
+        self.filled = 0
+        self.lock = Lock()
+
+        register(self.close)
+
+    def append(self, timestamp, values):
+        """Add one sample.
+
+        Args:
+            timestamp (datetime): Time of the sample
+            values (list): One reading per channel
+        """
+
+        with self.lock:
+            row = self.current[self.filled]
+            row[0] = (timestamp - EPOCH).total_seconds()
+            row[1:] = values
+            self.filled += 1
+
+            if self.filled == self.segment_samples:
+                self._seal()
+
+    def _seal(self):
+        self.segments.append((self.sealed, self.current))
+        self.starts.append(self.current[0, 0])
+        self.sealed += 1
+        self.current = empty((self.segment_samples, self.channels + 1))
+        self.filled = 0
+
+        # Page out the oldest segments still in RAM until back under budget
+        segment_bytes = self.current.nbytes
+        while (
+            self.paged < len(self.segments)
+            and (len(self.segments) - self.paged + 1) * segment_bytes > self.ram_budget
+        ):
+            number, data = self.segments[self.paged]
+            file_path = path.join(self.spool_dir, f"segment-{number}.npy")
+            save(file_path, data)
+            self.segments[self.paged] = (number, file_path)
+            self.paged += 1
+
+        # Drop segments past the retention limit
+        while len(self.segments) > self.max_segments:
+            number, data = self.segments.pop(0)
+            self.starts.pop(0)
+            self.envelopes.pop(number, None)
+            if isinstance(data, str):
+                self.paged -= 1
+                if self.readers.get(data):
+                    self.dropped.add(data)
+                else:
+                    remove(data)
+
+    def window(self, seconds=None, max_points=None):
+        """Samples from the last `seconds` of history, mapping in paged out segments as
+            needed. Only the bookkeeping is done under the lock, so a long view does not hold
+            up append().
+
+        Args:
+            seconds (float): Length of the window, everything kept if None or 0
+            max_points (int): Reduce the window to about this many points, keeping the
+                minimum and maximum of each stretch so short transients stay visible
+
+        Returns:
+            tuple: (times as datetime64 array, values array of shape (samples, channels))
+        """
+
+        with self.lock:
+            current = self.current[: self.filled].copy()
+            if len(current):
+                newest = current[-1:]
+            elif self.segments:
+                newest = self._load(self.segments[-1][1])[-1:].copy()
+            else:
+                return empty(0, dtype="datetime64[us]"), empty((0, self.channels))
+
+            first = 0
+            if seconds:
+                cutoff = newest[0, 0] - seconds
+                first = max(bisect_right(self.starts, cutoff) - 1, 0)
+            else:
+                cutoff = None
+
+            segments = self.segments[first:]
+            files = [data for _, data in segments if isinstance(data, str)]
+            for file_path in files:
+                self.readers[file_path] = self.readers.get(file_path, 0) + 1
+
+        try:
+            data = self._read(segments, current, newest, cutoff, max_points)
+        finally:
+            with self.lock:
+                for file_path in files:
+                    self.readers[file_path] -= 1
+                    if not self.readers[file_path]:
+                        del self.readers[file_path]
+                        if file_path in self.dropped:
+                            self.dropped.remove(file_path)
+                            remove(file_path)
+
+        times = (data[:, 0] * 1e6).round().astype("int64").astype("datetime64[us]")
+
+        return times, data[:, 1:]
+
+    def _read(self, segments, current, newest, cutoff, max_points):
+        # (number, part) pairs, number is None once a part is trimmed and no longer whole
+        parts = [(number, self._load(data)) for number, data in segments]
+        parts.append((None, current))
+
+        if cutoff is not None:
+            # The cutoff can fall in any part that starts before it, the filling one included
+            parts = [
+                (
+                    number if part[0, 0] >= cutoff else None,
+                    part[part[:, 0].searchsorted(cutoff) :],
+                )
+                for number, part in parts
+                if len(part) and part[-1, 0] >= cutoff
+            ]
+
+        total = sum(len(part) for _, part in parts)
+        if not max_points or total <= max_points:
+            return concatenate([part for _, part in parts])
+
+        # Two points (min and max) per bucket of `step` samples
+        step = int(ceil(2 * total / max_points))
+
+        envelopes = []
+        for number, part in parts:
+            cached = self.envelopes.get(number)
+            if cached is not None and cached[0] == step:
+                envelopes.append(cached[1])
+                continue
+            envelope = self._envelope(part, step)
+            if number is not None:
+                self.envelopes[number] = (step, envelope)
+            envelopes.append(envelope)
+
+        # Finish on the newest sample itself so the live value is always shown
+        envelopes.append(newest)
+
+        return concatenate(envelopes)
+
+    @staticmethod
+    def _envelope(part, step):
+        # Each bucket becomes two points at its first and last time, holding its minimum and
+        # maximum in the order they occurred on each channel
+        full = len(part) // step
+        buckets = [part[: full * step].reshape(full, step, part.shape[1])]
+        if len(part) > full * step:
+            buckets.append(part[full * step :][None])
+
+        envelopes = []
+        for bucket in buckets:
+            values = bucket[:, :, 1:]
+            lowest = fmin.reduce(values, axis=1)
+            highest = fmax.reduce(values, axis=1)
+            missing = isnan(values)
+            min_first = where(missing, inf, values).argmin(axis=1) <= where(
+                missing, -inf, values
+            ).argmax(axis=1)
+
+            envelope = empty((len(bucket) * 2, part.shape[1]))
+            envelope[0::2, 0] = bucket[:, 0, 0]
+            envelope[0::2, 1:] = where(min_first, lowest, highest)
+            envelope[1::2, 0] = bucket[:, -1, 0]
+            envelope[1::2, 1:] = where(min_first, highest, lowest)
+            envelopes.append(envelope)
+
+        return concatenate(envelopes)
+
+    @staticmethod
+    def _load(data):
+        if isinstance(data, str):
+            return load(data, mmap_mode="r")
+        return data
+
+    def close(self):
+        """Remove the paged out segments from disk."""
+
+        rmtree(self.spool_dir, ignore_errors=True)
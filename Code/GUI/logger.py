@@ -0,0 +1,96 @@
+"""Headless magnetometer logger. Runs acquisition, event detection and logging without the
+    dashboard, so none of dash, plotly or pandas are imported. It can also replay existing log
+    files through the same pipeline to benchmark it.
+
+    python logger.py --port /dev/ttyUSB0 --log-dir /home/pi/logs
+    python logger.py --replay Day-05.txt --speed 0 --log-dir /tmp/replay
+"""
+
+from time import perf_counter
+
+launch_time = perf_counter()
+
+from argparse import ArgumentParser
+from os import makedirs, path
+from time import sleep
+import acquisition
+
+
+def main():
+    parser = ArgumentParser(description="Headless magnetometer logger")
+    parser.add_argument("--port", help="Serial port of the magnetometer controller")
+    parser.add_argument("--log-dir", help="Directory to write logs and events to, replays go in its Replay folder")
+    parser.add_argument(
+        "--replay",
+        nargs="+",
+        metavar="FILE",
+        help="Replay log files through the pipeline instead of reading the sensors",
+    )
+    parser.add_argument(
+        "--speed",
+        type=float,
+        default=0,
+        help="Replay speed relative to real time, 0 to run as fast as possible (default)",
+    )
+    args = parser.parse_args()
+
+    if args.port is None and args.replay is None:
+        parser.error("one of --port or --replay is required")
+
+    print("imports took {:.3f}s".format(perf_counter() - launch_time))
+
+    if args.log_dir is not None:
+        if not path.exists(args.log_dir):
+            parser.error("log directory does not exist")
+        if args.replay is not None:
+            # Keep replayed data out of the live logs
+            log_dir = path.join(args.log_dir, "Replay")
+            # A file inside the output tree could be the one its own samples get appended to
+            for file_path in args.replay:
+                if path.commonpath(
+                    [path.realpath(file_path), path.realpath(log_dir)]
+                ) == path.realpath(log_dir):
+                    parser.error(f"{file_path} is inside the replay output folder {log_dir}")
+            if not path.exists(log_dir):
+                makedirs(log_dir)
+        else:
+            log_dir = args.log_dir
+        acquisition.log_path = log_dir
+        acquisition.event_log.set()
+
+    if args.replay is not None:
+        acquisition.start(acquire=False)
+        print("started in {:.3f}s".format(perf_counter() - launch_time))
+
+        try:
+            for file_path in args.replay:
+                replay_start = perf_counter()
+                count = acquisition.replay(file_path, args.speed)
+                elapsed = perf_counter() - replay_start
+                print(
+                    "replayed {} samples from {} in {:.3f}s ({:.0f} samples/s)".format(
+                        count, file_path, elapsed, count / elapsed if elapsed > 0 else 0
+                    )
+                )
+        except KeyboardInterrupt:
+            pass
+        finally:
+            acquisition.stop()
+        return
+
+    if not acquisition.connect(args.port):
+        print("no magnetometer controller on", args.port)
+        return
+
+    acquisition.start()
+    print("started in {:.3f}s".format(perf_counter() - launch_time))
+
+    try:
+        while True:
+            sleep(1)
+    except KeyboardInterrupt:
+        acquisition.stop()
+
+
+if __name__ == "__main__":
+    main()